@@ -4,11 +4,14 @@ CHIMERA Back-Test Workbench — Data Loader
 Parse NDJSON files and join books + catalogue data into MarketSnapshot objects.
 """
 
+import re
+from functools import lru_cache
 from dataclasses import dataclass, field
 from typing import Optional
 
 
-@dataclass
+# Read-only by convention; not frozen, as frozen init is much slower to build
+@dataclass(slots=True)
 class RunnerSnapshot:
     """A runner at a point in time with price and metadata."""
     selection_id: int
@@ -23,7 +26,7 @@ class RunnerSnapshot:
     total_matched: float = 0.0
 
 
-@dataclass
+@dataclass(slots=True)
 class MarketSnapshot:
     """A single market at a point in time, with both price and metadata."""
     market_id: str
@@ -40,25 +43,54 @@ class MarketSnapshot:
     runners: list[RunnerSnapshot] = field(default_factory=list)
 
 
+# Runner statuses that carry a settled result
+SETTLED_STATUSES = frozenset(("WINNER", "LOSER", "REMOVED"))
+
+# Shared read-only default for runners with no exchange prices
+_EMPTY_EX: dict = {}
+
 EXOTIC_PATTERNS = [
     "forecast", "reverse fc", "match bet", "without ",
     "to win by over", "to be placed", "each way",
     "daily win dist", "winning distances",
 ]
 
+# All exotic patterns as one case-insensitive alternation, so a single C-level
+# scan replaces lower() plus one substring search per pattern
+_EXOTIC_RE = re.compile(
+    "|".join(re.escape(p) for p in EXOTIC_PATTERNS), re.IGNORECASE
+)
+
 
+@lru_cache(maxsize=4096)
 def is_main_race_market(market_name: str, event_name: str = "") -> bool:
     """
     Identify if a market is a main race WIN market (not exotic).
     The live engine only fetches WIN market types from Betfair.
     Since back-data doesn't have marketType, we filter by name patterns.
     Checks both market_name and event_name (some exotics have swapped fields).
+    Memoised, since the same few hundred names recur in every snapshot of a day.
+    """
+    combined = f"{market_name} {event_name}".strip()
+    return _EXOTIC_RE.search(combined) is None
+
+
+# marketId → (catalogue entry, {selectionId: runnerName})
+CatalogueIndex = dict[str, tuple[dict, dict[int, str]]]
+
+
+def index_catalogue(catalogues: list[dict]) -> CatalogueIndex:
+    """
+    Index catalogue entries by marketId, with each market's runner name map.
+    Build once per catalogue file and reuse it for every books file it pairs with.
     """
-    combined = f"{market_name} {event_name}".lower().strip()
-    for pattern in EXOTIC_PATTERNS:
-        if pattern in combined:
-            return False
-    return True
+    return {
+        c["marketId"]: (
+            c,
+            {r["selectionId"]: r["runnerName"] for r in c.get("runners", [])},
+        )
+        for c in catalogues
+    }
 
 
 def join_books_and_catalogue(
@@ -69,32 +101,48 @@ def join_books_and_catalogue(
     Join books and catalogue entries by marketId.
     Returns a list of MarketSnapshot objects with full runner data.
     """
-    # Index catalogues by marketId
-    cat_by_id = {c["marketId"]: c for c in catalogues}
+    return join_books_with_prebuilt_catalogue(books, index_catalogue(catalogues))
 
+
+def join_books_with_prebuilt_catalogue(
+    books: list[dict],
+    cat_index: CatalogueIndex,
+    win_only: bool = False,
+) -> list[MarketSnapshot]:
+    """
+    Join books entries against a catalogue index built by index_catalogue().
+    With win_only=True, markets that are not main race WIN markets are dropped
+    before any runner objects are built for them.
+    """
     results = []
     for book in books:
         mid = book["marketId"]
-        cat = cat_by_id.get(mid)
-        if cat is None:
+        indexed = cat_index.get(mid)
+        if indexed is None:
             continue
+        cat, runner_names = indexed
+        event = cat.get("event", {})
 
-        # Build runner name map from catalogue
-        runner_names = {
-            r["selectionId"]: r["runnerName"]
-            for r in cat.get("runners", [])
-        }
+        if win_only and not (
+            book.get("numberOfWinners", 1) == 1
+            and is_main_race_market(cat.get("marketName", ""), event.get("name", ""))
+        ):
+            continue
 
         # Build runner snapshots from book + catalogue data
         runners = []
-        for r in book.get("runners", []):
+        for r in book.get("runners", ()):
             sid = r["selectionId"]
-            lay_prices = r.get("ex", {}).get("availableToLay", [])
-            back_prices = r.get("ex", {}).get("availableToBack", [])
+            ex = r.get("ex") or _EMPTY_EX
+            lay_prices = ex.get("availableToLay") or []
+            back_prices = ex.get("availableToBack") or []
+            name = runner_names.get(sid)
+            if name is None:
+                name = f"Selection {sid}"
 
             runners.append(RunnerSnapshot(
                 selection_id=sid,
-                runner_name=runner_names.get(sid, f"Selection {sid}"),
+                runner_name=name,
                 handicap=r.get("handicap", 0.0),
                 status=r.get("status", "ACTIVE"),
                 best_available_to_lay=lay_prices[0]["price"] if lay_prices else None,
@@ -105,7 +153,6 @@ def join_books_and_catalogue(
                 total_matched=r.get("totalMatched", 0.0),
             ))
 
-        event = cat.get("event", {})
         results.append(MarketSnapshot(
             market_id=mid,
             market_name=cat.get("marketName", ""),
@@ -5,53 +5,116 @@ List and read NDJSON files from Google Cloud Storage.
 Also supports reading local files for development.
 """
 
-import json
+import io
+import hashlib
 import os
 import re
 import time
+import threading
+import pickle
 import logging
+from collections import OrderedDict
+from concurrent.futures import Future
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Optional
 
+import orjson
+
+from data_loader import (
+    CatalogueIndex, MarketSnapshot, index_catalogue, join_books_with_prebuilt_catalogue,
+)
+
 logger = logging.getLogger("gcs_reader")
 
+# Bump when MarketSnapshot/RunnerSnapshot change shape so stale caches are ignored
+SNAPSHOT_CACHE_VERSION = "v1"
+
 FILENAME_PATTERN = re.compile(
-    r"betfair-live_7_(\d{4}-\d{2}-\d{2})_(books|catalogue)_(\d{2}-\d{2}-\d{2})\.ndjson"
+    r"betfair-live_7_(\d{4}-\d{2}-\d{2})_(books|catalogue)_(\d{2}-\d{2}-\d{2})\.ndjson",
+    re.ASCII,
 )
+DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}", re.ASCII)
+GCS_TIMESTAMP_PATTERN = re.compile(r"(\d{2}-\d{2}-\d{2})\.ndjson", re.ASCII)
 
 
-@dataclass
+@dataclass(slots=True)
 class SnapshotPair:
     """A paired books + catalogue snapshot."""
     date: str
     timestamp: str  # "HH-MM-SS"
     books_path: str
     catalogue_path: str
+    catalogue_hash: Optional[str] = None  # content digest, when the listing provides one
+    # GCS object generations from the listing, so reads need no metadata request
+    books_generation: Optional[int] = None
+    catalogue_generation: Optional[int] = None
 
 
 def parse_filename(name: str) -> Optional[tuple[str, str, str]]:
     """Parse a filename into (date, data_type, time). Returns None if not matching."""
     # Strip directory prefix
-    basename = name.rsplit("/", 1)[-1] if "/" in name else name
-    m = FILENAME_PATTERN.match(basename)
+    basename = name.rpartition("/")[2]
+    m = FILENAME_PATTERN.fullmatch(basename)
     if m:
         return m.group(1), m.group(2), m.group(3)
     return None
 
 
+def _parse_ndjson_lines(lines) -> list[dict]:
+    """Parse an iterable of NDJSON byte lines, skipping blank lines."""
+    entries = []
+    for line in lines:
+        # orjson accepts surrounding whitespace, so only blank lines need skipping
+        if line and not line.isspace():
+            entries.append(orjson.loads(line))
+    return entries
+
+
+def _iter_chunk_lines(f, chunk_size: int):
+    """Yield the lines of a binary stream read in fixed-size chunks."""
+    partial = b""
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        lines = (partial + chunk).split(b"\n")
+        partial = lines.pop()  # incomplete last line, continued by the next chunk
+        yield from lines
+    if partial:
+        yield partial
+
+
 class DataReader:
     """
     Reads NDJSON data from either GCS or local filesystem.
     Provides a uniform interface for both.
     """
 
-    def __init__(self, bucket_name: Optional[str] = None, local_dir: Optional[str] = None):
+    def __init__(
+        self,
+        bucket_name: Optional[str] = None,
+        local_dir: Optional[str] = None,
+        cache_dir: Optional[str] = None,
+    ):
         self.bucket_name = bucket_name
         self.local_dir = local_dir
+        self.cache_dir = Path(cache_dir) if cache_dir else None
         self._gcs_client = None
         self._dates_cache: Optional[tuple[float, list[str]]] = None
+        self._snapshots_cache: dict[str, tuple[float, list[SnapshotPair]]] = {}
         self._CACHE_TTL = 300  # 5 minutes
+        # Catalogue indexes keyed by content digest: catalogues rarely change
+        # intra-day, so most snapshots share an index with an earlier one
+        self._catalogue_indexes: OrderedDict[str, Future] = OrderedDict()
+        self._catalogue_lock = threading.Lock()
+        self._CATALOGUE_CACHE_SIZE = 32
+        # Joined WIN markets per snapshot pair version, so re-running a simulation
+        # on the same date skips download and parsing. Entries hold exotic-free
+        # MarketSnapshots rather than raw NDJSON dicts, and the count is bounded.
+        self._markets_cache: OrderedDict[tuple, list[MarketSnapshot]] = OrderedDict()
+        self._markets_lock = threading.Lock()
+        self._MARKETS_CACHE_SIZE = 256
 
     @property
     def gcs_client(self):
@@ -81,20 +144,150 @@ class DataReader:
 
     def list_snapshots_for_date(self, date: str) -> list[SnapshotPair]:
         """List all paired snapshots for a given date, sorted chronologically."""
+        # Check cache
+        cached = self._snapshots_cache.get(date)
+        if cached:
+            cached_at, pairs = cached
+            if time.time() - cached_at < self._CACHE_TTL:
+                return pairs
+
         if self.local_dir:
-            return self._list_snapshots_local(date)
+            pairs = self._list_snapshots_local(date)
         elif self.bucket_name:
-            return self._list_snapshots_gcs(date)
-        return []
+            pairs = self._list_snapshots_gcs(date)
+        else:
+            pairs = []
+
+        self._snapshots_cache[date] = (time.time(), pairs)
+        return pairs
 
-    def read_ndjson(self, path: str) -> list[dict]:
-        """Read an NDJSON file and return list of parsed JSON objects."""
+    def read_ndjson(self, path: str, generation: Optional[int] = None) -> list[dict]:
+        """
+        Read an NDJSON file and return list of parsed JSON objects.
+        `generation` pins a GCS object version (e.g. from SnapshotPair).
+        """
         if self.local_dir:
             return self._read_local(path)
         elif self.bucket_name:
-            return self._read_gcs(path)
+            return self._read_gcs(path, generation=generation)
         return []
 
+    def load_win_markets(self, sp: SnapshotPair) -> list[MarketSnapshot]:
+        """
+        Load a snapshot pair as joined MarketSnapshots for main race WIN markets
+        (exotics are filtered out before their runners are built).
+        Results are memoised in memory per file version (and cached on disk when
+        cache_dir is set), so the returned list is shared and must not be mutated.
+        """
+        key = self._pair_key(sp)
+        with self._markets_lock:
+            markets = self._markets_cache.get(key)
+            if markets is not None:
+                self._markets_cache.move_to_end(key)
+                return markets
+
+        markets = None
+        cache_path = self._cache_path(key, sp)
+        if cache_path is not None and cache_path.exists():
+            try:
+                with open(cache_path, "rb") as f:
+                    markets = pickle.load(f)
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable snapshot cache {cache_path}: {e}")
+
+        if markets is None:
+            books = self.read_ndjson(sp.books_path, sp.books_generation)
+            markets = join_books_with_prebuilt_catalogue(
+                books, self._catalogue_index(sp), win_only=True
+            )
+            if cache_path is not None:
+                self._write_cache(cache_path, markets)
+
+        with self._markets_lock:
+            self._markets_cache[key] = markets
+            if len(self._markets_cache) > self._MARKETS_CACHE_SIZE:
+                self._markets_cache.popitem(last=False)
+        return markets
+
+    def _pair_key(self, sp: SnapshotPair) -> tuple:
+        """
+        Identify a snapshot pair by data source, paths and the version of both
+        files, so a different bucket/directory or a re-upload never hits a cache.
+        """
+        if self.local_dir:
+            books, cat = os.stat(sp.books_path), os.stat(sp.catalogue_path)
+            source = os.path.abspath(self.local_dir)
+            versions = (books.st_mtime_ns, books.st_size, cat.st_mtime_ns, cat.st_size)
+        else:
+            source = f"gs://{self.bucket_name}"
+            versions = (sp.books_generation, sp.catalogue_generation)
+        return source, sp.books_path, sp.catalogue_path, versions
+
+    def _catalogue_index(self, sp: SnapshotPair) -> CatalogueIndex:
+        """
+        Return the catalogue index for a snapshot, reusing any earlier index built
+        from identical catalogue content.
+        """
+        content = None
+        digest = sp.catalogue_hash
+        if digest is None and self.local_dir:
+            with open(sp.catalogue_path, "rb") as f:
+                content = f.read()
+            digest = hashlib.sha1(content).hexdigest()
+        key = digest or sp.catalogue_path
+
+        # The lock only guards the cache itself. The first loader of a catalogue
+        # registers a future and builds the index outside the lock; parallel loads
+        # of the same catalogue wait on that future, other catalogues proceed.
+        with self._catalogue_lock:
+            pending = self._catalogue_indexes.get(key)
+            is_builder = pending is None
+            if is_builder:
+                pending = self._catalogue_indexes[key] = Future()
+                if len(self._catalogue_indexes) > self._CATALOGUE_CACHE_SIZE:
+                    self._catalogue_indexes.popitem(last=False)
+            else:
+                self._catalogue_indexes.move_to_end(key)
+
+        if is_builder:
+            try:
+                if content is not None:
+                    entries = _parse_ndjson_lines(io.BytesIO(content))
+                else:
+                    entries = self.read_ndjson(sp.catalogue_path, sp.catalogue_generation)
+                pending.set_result(index_catalogue(entries))
+            except BaseException as e:
+                pending.set_exception(e)
+                with self._catalogue_lock:
+                    if self._catalogue_indexes.get(key) is pending:
+                        del self._catalogue_indexes[key]
+                raise
+        return pending.result()
+
+    # ── Snapshot cache ──
+
+    def _cache_path(self, key: tuple, sp: SnapshotPair) -> Optional[Path]:
+        """Cache file for a snapshot pair, named by a digest of its _pair_key()."""
+        if self.cache_dir is None:
+            return None
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+        return (
+            self.cache_dir / SNAPSHOT_CACHE_VERSION / sp.date
+            / f"{sp.timestamp}-{digest}.pickle"
+        )
+
+    def _write_cache(self, path: Path, markets: list[MarketSnapshot]):
+        # Write to a temp file then rename, so concurrent readers never see a partial file
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp, "wb") as f:
+                pickle.dump(markets, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Could not write snapshot cache {path}: {e}")
+            tmp.unlink(missing_ok=True)
+
     # ── Local filesystem ──
 
     def _list_dates_local(self) -> list[str]:
@@ -137,13 +330,8 @@ class DataReader:
         return pairs
 
     def _read_local(self, path: str) -> list[dict]:
-        entries = []
-        with open(path, "r") as f:
-            for line in f:
-                line = line.strip()
-                if line:
-                    entries.append(json.loads(line))
-        return entries
+        with open(path, "rb") as f:
+            return _parse_ndjson_lines(f)
 
     # ── Google Cloud Storage ──
     #
@@ -152,11 +340,16 @@ class DataReader:
     #   betfair-live/7/{YYYY-MM-DD}/catalogue/{HH-MM-SS}.ndjson
 
     GCS_PREFIX = "betfair-live/7/"
+    GCS_CHUNK_SIZE = 8 * 1024 * 1024  # bytes fetched per ranged download
+    # Only request the blob metadata we use from LIST calls
+    GCS_LIST_FIELDS = "items(name,generation,md5Hash),nextPageToken"
 
     def _list_dates_gcs(self) -> list[str]:
         bucket = self.gcs_client.bucket(self.bucket_name)
         # Use delimiter to list "folder" prefixes under betfair-live/7/
-        iterator = bucket.list_blobs(prefix=self.GCS_PREFIX, delimiter="/")
+        iterator = bucket.list_blobs(
+            prefix=self.GCS_PREFIX, delimiter="/", fields="prefixes,nextPageToken",
+        )
         # Must consume the iterator for prefixes to populate
         _ = list(iterator)
         dates = set()
@@ -164,31 +357,27 @@ class DataReader:
             # prefix looks like "betfair-live/7/2026-02-13/"
             parts = prefix.rstrip("/").split("/")
             date_str = parts[-1]  # "2026-02-13"
-            if re.match(r"\d{4}-\d{2}-\d{2}$", date_str):
+            if DATE_PATTERN.fullmatch(date_str):
                 dates.add(date_str)
         return list(dates)
 
     def _list_snapshots_gcs(self, date: str) -> list[SnapshotPair]:
         bucket = self.gcs_client.bucket(self.bucket_name)
-        ts_pattern = re.compile(r"(\d{2}-\d{2}-\d{2})\.ndjson$")
-
-        # List books files
-        books_prefix = f"{self.GCS_PREFIX}{date}/books/"
-        books_by_ts: dict[str, str] = {}
-        for blob in bucket.list_blobs(prefix=books_prefix):
-            fname = blob.name.rsplit("/", 1)[-1]
-            m = ts_pattern.match(fname)
-            if m:
-                books_by_ts[m.group(1)] = blob.name
-
-        # List catalogue files
-        cat_prefix = f"{self.GCS_PREFIX}{date}/catalogue/"
-        cat_by_ts: dict[str, str] = {}
-        for blob in bucket.list_blobs(prefix=cat_prefix):
-            fname = blob.name.rsplit("/", 1)[-1]
-            m = ts_pattern.match(fname)
+
+        # List books and catalogue files for the date in a single LIST call
+        date_prefix = f"{self.GCS_PREFIX}{date}/"
+        by_type: dict[str, dict[str, object]] = {"books": {}, "catalogue": {}}
+        for blob in bucket.list_blobs(prefix=date_prefix, fields=self.GCS_LIST_FIELDS):
+            # Remainder looks like "books/11-25-56.ndjson"
+            data_type, _, fname = blob.name[len(date_prefix):].partition("/")
+            files = by_type.get(data_type)
+            if files is None:
+                continue
+            m = GCS_TIMESTAMP_PATTERN.fullmatch(fname)
             if m:
-                cat_by_ts[m.group(1)] = blob.name
+                files[m.group(1)] = blob
+        books_by_ts = by_type["books"]
+        cat_by_ts = by_type["catalogue"]
 
         # Pair by matching timestamp
         all_timestamps = sorted(set(books_by_ts.keys()) & set(cat_by_ts.keys()))
@@ -197,19 +386,24 @@ class DataReader:
             pairs.append(SnapshotPair(
                 date=date,
                 timestamp=ts,
-                books_path=books_by_ts[ts],
-                catalogue_path=cat_by_ts[ts],
+                books_path=books_by_ts[ts].name,
+                catalogue_path=cat_by_ts[ts].name,
+                # The listing already carries the MD5, so identical catalogues
+                # can be detected without downloading them
+                catalogue_hash=cat_by_ts[ts].md5_hash,
+                books_generation=books_by_ts[ts].generation,
+                catalogue_generation=cat_by_ts[ts].generation,
             ))
 
         logger.info(f"Date {date}: {len(books_by_ts)} books, {len(cat_by_ts)} catalogues, {len(pairs)} paired snapshots")
         return pairs
 
-    def _read_gcs(self, blob_name: str) -> list[dict]:
+    def _read_gcs(self, blob_name: str, generation: Optional[int] = None) -> list[dict]:
         bucket = self.gcs_client.bucket(self.bucket_name)
-        blob = bucket.blob(blob_name)
-        content = blob.download_as_text()
-        entries = []
-        for line in content.strip().split("\n"):
-            if line:
-                entries.append(json.loads(line))
-        return entries
+        blob = bucket.blob(blob_name, generation=generation)
+        # Stream the blob in chunks so parsing overlaps the download and peak
+        # memory is one chunk rather than the whole file. Lines are split here
+        # rather than via io.BufferedReader, whose tell() would make BlobReader
+        # reload the blob's metadata on every read.
+        with blob.open("rb", chunk_size=self.GCS_CHUNK_SIZE) as raw:
+            return _parse_ndjson_lines(_iter_chunk_lines(raw, self.GCS_CHUNK_SIZE))
@@ -10,13 +10,13 @@ import logging
 from pathlib import Path
 
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional
 from dotenv import load_dotenv
 
 from gcs_reader import DataReader
-from data_loader import join_books_and_catalogue, is_main_race_market
 from strategy_schema import Strategy
 from simulator import Simulator, SimulationRequest
 from default_strategies import CHIMERA_DEFAULT
@@ -30,6 +30,7 @@ logger = logging.getLogger("main")
 GCS_BUCKET_NAME = os.environ.get("GCS_BUCKET_NAME", "")
 LOCAL_DATA_DIR = os.environ.get("LOCAL_DATA_DIR", "../back-data")
 STRATEGIES_DIR = Path(os.environ.get("STRATEGIES_DIR", "./strategies"))
+SNAPSHOT_CACHE_DIR = os.environ.get("SNAPSHOT_CACHE_DIR", "")  # unset/empty = disabled
 FRONTEND_URL = os.environ.get("FRONTEND_URL", "http://localhost:5173")
 
 # Ensure strategies directory exists
@@ -39,6 +40,7 @@ STRATEGIES_DIR.mkdir(parents=True, exist_ok=True)
 reader = DataReader(
     bucket_name=GCS_BUCKET_NAME if GCS_BUCKET_NAME else None,
     local_dir=LOCAL_DATA_DIR if not GCS_BUCKET_NAME else None,
+    cache_dir=SNAPSHOT_CACHE_DIR or None,
 )
 
 simulator = Simulator(reader)
@@ -99,17 +101,9 @@ def list_markets(date: str):
     if not snapshots:
         return {"date": date, "venues": [], "total_markets": 0}
 
-    # Use the first snapshot to get market listing
-    sp = snapshots[0]
-    books = reader.read_ndjson(sp.books_path)
-    cats = reader.read_ndjson(sp.catalogue_path)
-    markets = join_books_and_catalogue(books, cats)
-
-    # Filter to main race WIN markets (exclude exotics like Forecast, Each Way, etc.)
-    win_markets = [
-        m for m in markets
-        if m.number_of_winners == 1 and is_main_race_market(m.market_name, m.event_name)
-    ]
+    # Use the first snapshot to get market listing. The loader already drops
+    # exotics (Forecast, Each Way, etc.), leaving main race WIN markets only.
+    win_markets = reader.load_win_markets(snapshots[0])
 
     # Group by venue
     venues: dict[str, list] = {}
@@ -118,11 +112,22 @@ def list_markets(date: str):
         if venue not in venues:
             venues[venue] = []
 
-        # Count active runners with lay prices
-        active_runners = [
-            r for r in m.runners
-            if r.status == "ACTIVE" and r.best_available_to_lay is not None
-        ]
+        # One pass over the runners: collect active ones for the response and
+        # count those with lay prices
+        runners = []
+        runner_count = 0
+        for r in m.runners:
+            if r.status != "ACTIVE":
+                continue
+            if r.best_available_to_lay is not None:
+                runner_count += 1
+            runners.append({
+                "selection_id": r.selection_id,
+                "runner_name": r.runner_name,
+                "best_lay_odds": r.best_available_to_lay,
+                "best_back_odds": r.best_available_to_back,
+                "status": r.status,
+            })
 
         venues[venue].append({
             "market_id": m.market_id,
@@ -130,19 +135,9 @@ def list_markets(date: str):
             "market_start_time": m.market_start_time,
             "venue": venue,
             "event_name": m.event_name,
-            "runner_count": len(active_runners),
+            "runner_count": runner_count,
             "total_matched": m.total_matched,
-            "runners": [
-                {
-                    "selection_id": r.selection_id,
-                    "runner_name": r.runner_name,
-                    "best_lay_odds": r.best_available_to_lay,
-                    "best_back_odds": r.best_available_to_back,
-                    "status": r.status,
-                }
-                for r in m.runners
-                if r.status == "ACTIVE"
-            ],
+            "runners": runners,
         })
 
     # Sort venues and markets within each venue
@@ -171,7 +166,9 @@ def simulate(body: SimulateBody):
         market_ids=body.market_ids,
     )
     result = simulator.run(request)
-    return result.to_dict()
+    # Serialise the result dataclass straight to bytes with orjson, bypassing
+    # FastAPI's recursive jsonable_encoder pass over thousands of nested dicts
+    return ORJSONResponse(result)
 
 
 @app.get("/api/strategies/default")
@@ -8,7 +8,7 @@ from dataclasses import dataclass
 from strategy_engine import BetInstruction
 
 
-@dataclass
+@dataclass(slots=True)
 class BetOutcome:
     """A bet with its result and P&L."""
     instruction: BetInstruction
@@ -57,6 +57,30 @@ def calculate_bet_pnl(instruction: BetInstruction, runner_result: str) -> float:
     return 0.0
 
 
+def settle_bets(
+    instructions: list[BetInstruction], runner_results: dict[int, str]
+) -> list[BetOutcome]:
+    """
+    Resolve one market's bet instructions against its runner results.
+    An unsettled market (no results) voids every bet without per-bet P&L work.
+    """
+    if not runner_results:
+        return [
+            BetOutcome(instruction=i, runner_result="UNKNOWN", profit=0.0)
+            for i in instructions
+        ]
+
+    outcomes = []
+    for instruction in instructions:
+        runner_result = runner_results.get(instruction.selection_id, "UNKNOWN")
+        outcomes.append(BetOutcome(
+            instruction=instruction,
+            runner_result=runner_result,
+            profit=calculate_bet_pnl(instruction, runner_result),
+        ))
+    return outcomes
+
+
 def aggregate_pnl(outcomes: list[BetOutcome]) -> dict:
     """Compute summary statistics across all bet outcomes."""
     if not outcomes:
@@ -72,27 +96,35 @@ def aggregate_pnl(outcomes: list[BetOutcome]) -> dict:
             "avg_loss": 0.0,
         }
 
-    wins = [o for o in outcomes if o.profit > 0]
-    losses = [o for o in outcomes if o.profit < 0]
-    voids = [o for o in outcomes if o.profit == 0]
-
-    total_pnl = sum(o.profit for o in outcomes)
-    total_liability = sum(o.instruction.liability for o in outcomes)
+    # Single pass over the outcomes, accumulating every statistic together
+    win_count = loss_count = void_count = 0
+    win_total = loss_total = 0.0
+    total_pnl = total_stake = total_liability = 0.0
+    for o in outcomes:
+        profit = o.profit
+        instruction = o.instruction
+        total_pnl += profit
+        total_stake += instruction.stake
+        total_liability += instruction.liability
+        if profit > 0:
+            win_count += 1
+            win_total += profit
+        elif profit < 0:
+            loss_count += 1
+            loss_total += profit
+        else:
+            void_count += 1
 
     return {
         "total_pnl": round(total_pnl, 2),
-        "win_count": len(wins),
-        "loss_count": len(losses),
-        "void_count": len(voids),
-        "total_stake": round(sum(o.instruction.stake for o in outcomes), 2),
+        "win_count": win_count,
+        "loss_count": loss_count,
+        "void_count": void_count,
+        "total_stake": round(total_stake, 2),
         "total_liability": round(total_liability, 2),
         "roi_percent": round(
             (total_pnl / total_liability * 100), 2
         ) if total_liability > 0 else 0.0,
-        "avg_win": round(
-            sum(o.profit for o in wins) / len(wins), 2
-        ) if wins else 0.0,
-        "avg_loss": round(
-            sum(o.profit for o in losses) / len(losses), 2
-        ) if losses else 0.0,
+        "avg_win": round(win_total / win_count, 2) if win_count else 0.0,
+        "avg_loss": round(loss_total / loss_count, 2) if loss_count else 0.0,
     }
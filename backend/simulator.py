@@ -5,26 +5,48 @@ Orchestrator: load snapshot data → apply strategy → resolve results → comp
 """
 
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from typing import Optional
 
 from gcs_reader import DataReader
-from data_loader import MarketSnapshot, RunnerSnapshot, join_books_and_catalogue, is_main_race_market
+from data_loader import MarketSnapshot, RunnerSnapshot, SETTLED_STATUSES
 from strategy_schema import Strategy
-from strategy_engine import evaluate_strategy, EvaluationResult
-from pnl import BetOutcome, calculate_bet_pnl, aggregate_pnl
+from strategy_engine import evaluate_markets, EvaluationResult
+from pnl import BetOutcome, settle_bets, aggregate_pnl
 
 logger = logging.getLogger("simulator")
 
+# Snapshot loads are I/O-bound, so threads overlap the reads despite the GIL
+MAX_LOAD_WORKERS = 16
 
-@dataclass
+
+@dataclass(slots=True)
+class MarketTimeline:
+    """
+    The pre-race and settled snapshots of one market, tracked as its snapshots
+    are added in chronological order (only these two are kept).
+    """
+    pre_race: Optional[MarketSnapshot] = None  # last OPEN, not in-play
+    settled: Optional[MarketSnapshot] = None   # last with WINNER/LOSER runners
+
+    def add(self, market: MarketSnapshot):
+        if market.status == "OPEN" and not market.inplay:
+            self.pre_race = market
+        for r in market.runners:
+            if r.status in ("WINNER", "LOSER"):
+                self.settled = market
+                break
+
+
+@dataclass(slots=True)
 class SimulationRequest:
     date: str
     strategy: Strategy
     market_ids: Optional[list[str]] = None  # None = all markets
 
 
-@dataclass
+@dataclass(slots=True)
 class SimulationResult:
     date: str
     strategy_name: str
@@ -32,7 +54,8 @@ class SimulationResult:
     markets_with_bets: int
     bets_placed: int
     bet_outcomes: list[dict] = field(default_factory=list)
-    evaluations: list[dict] = field(default_factory=list)
+    # Kept as dataclasses: orjson serialises them directly in the API response
+    evaluations: list[EvaluationResult] = field(default_factory=list)
     summary: dict = field(default_factory=dict)
 
     def to_dict(self) -> dict:
@@ -43,7 +66,7 @@ class SimulationResult:
             "markets_with_bets": self.markets_with_bets,
             "bets_placed": self.bets_placed,
             "bet_outcomes": self.bet_outcomes,
-            "evaluations": self.evaluations,
+            "evaluations": [e.to_dict() for e in self.evaluations],
             "summary": self.summary,
         }
 
@@ -73,97 +96,58 @@ class Simulator:
             )
 
         # Load all snapshot data and build per-market timelines
-        market_timelines: dict[str, list[tuple[str, MarketSnapshot]]] = {}
-
-        for sp in snapshots:
-            books = self.reader.read_ndjson(sp.books_path)
-            cats = self.reader.read_ndjson(sp.catalogue_path)
-            markets = join_books_and_catalogue(books, cats)
-
-            for m in markets:
-                if m.market_id not in market_timelines:
-                    market_timelines[m.market_id] = []
-                market_timelines[m.market_id].append((sp.timestamp, m))
-
-        # Filter to main race WIN markets (exclude exotics)
-        win_markets = {
-            mid: timeline for mid, timeline in market_timelines.items()
-            if any(
-                m.number_of_winners == 1 and is_main_race_market(m.market_name, m.event_name)
-                for _, m in timeline
-            )
-        }
+        # (the loader only returns main race WIN markets, exotics excluded)
+        market_timelines: dict[str, MarketTimeline] = {}
+
+        workers = min(MAX_LOAD_WORKERS, len(snapshots))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # map() yields in submission order, so timelines stay chronological
+            for markets in pool.map(self.reader.load_win_markets, snapshots):
+                for m in markets:
+                    if m.market_id not in market_timelines:
+                        market_timelines[m.market_id] = MarketTimeline()
+                    market_timelines[m.market_id].add(m)
+
+        # Pick each market's last pre-race snapshot (OPEN, not inplay)
+        wanted = set(request.market_ids) if request.market_ids else None
+        candidates = [
+            timeline for market_id, timeline in market_timelines.items()
+            if timeline.pre_race is not None
+            and (wanted is None or market_id in wanted)
+        ]
+
+        # Evaluate strategy across all markets in one batch
+        eval_results = evaluate_markets(
+            request.strategy, [t.pre_race for t in candidates]
+        )
 
         # Process each market
         all_outcomes: list[BetOutcome] = []
-        all_evaluations: list[dict] = []
         markets_with_bets = 0
 
-        for market_id, timeline in win_markets.items():
-            if request.market_ids and market_id not in request.market_ids:
-                continue
-
-            # Find the last pre-race snapshot (OPEN, not inplay)
-            pre_race = self._find_pre_race_snapshot(timeline)
-            if pre_race is None:
-                continue
-
-            # Evaluate strategy
-            eval_result = evaluate_strategy(request.strategy, pre_race)
-            all_evaluations.append(eval_result.to_dict())
-
+        for timeline, eval_result in zip(candidates, eval_results):
             if eval_result.skipped or not eval_result.instructions:
                 continue
 
             markets_with_bets += 1
 
             # Find settled snapshot for results
-            settled = self._find_settled_snapshot(timeline)
-            runner_results = self._extract_runner_results(settled)
+            runner_results = self._extract_runner_results(timeline.settled)
 
             # Calculate P&L for each bet
-            for instruction in eval_result.instructions:
-                runner_result = runner_results.get(
-                    instruction.selection_id, "UNKNOWN"
-                )
-                profit = calculate_bet_pnl(instruction, runner_result)
-                outcome = BetOutcome(
-                    instruction=instruction,
-                    runner_result=runner_result,
-                    profit=profit,
-                )
-                all_outcomes.append(outcome)
+            all_outcomes.extend(settle_bets(eval_result.instructions, runner_results))
 
         return SimulationResult(
             date=request.date,
             strategy_name=request.strategy.name,
-            markets_evaluated=len(all_evaluations),
+            markets_evaluated=len(eval_results),
             markets_with_bets=markets_with_bets,
             bets_placed=len(all_outcomes),
             bet_outcomes=[o.to_dict() for o in all_outcomes],
-            evaluations=all_evaluations,
+            evaluations=eval_results,
             summary=aggregate_pnl(all_outcomes),
         )
 
-    def _find_pre_race_snapshot(
-        self, timeline: list[tuple[str, MarketSnapshot]]
-    ) -> Optional[MarketSnapshot]:
-        """Find the last snapshot where market is OPEN and not in-play."""
-        for ts, market in reversed(timeline):
-            if market.status == "OPEN" and not market.inplay:
-                return market
-        return None
-
-    def _find_settled_snapshot(
-        self, timeline: list[tuple[str, MarketSnapshot]]
-    ) -> Optional[MarketSnapshot]:
-        """Find a snapshot where runners have WINNER/LOSER status."""
-        for ts, market in reversed(timeline):
-            for r in market.runners:
-                if r.status in ("WINNER", "LOSER"):
-                    return market
-        return None
-
     def _extract_runner_results(
         self, settled: Optional[MarketSnapshot]
     ) -> dict[int, str]:
@@ -173,5 +157,5 @@ class Simulator:
         return {
             r.selection_id: r.status
             for r in settled.runners
-            if r.status in ("WINNER", "LOSER", "REMOVED")
+            if r.status in SETTLED_STATUSES
         }
@@ -6,8 +6,9 @@ Designed to be dependency-free (no GCS, no FastAPI) so it can be copied
 into the live engine as a drop-in replacement for rules.py.
 """
 
+import operator
 from dataclasses import dataclass, field
-from typing import Optional
+from typing import Callable, NamedTuple, Optional, Union
 from datetime import datetime
 
 from strategy_schema import (
@@ -16,8 +17,27 @@ from strategy_schema import (
 )
 from data_loader import MarketSnapshot, RunnerSnapshot
 
-
-@dataclass
+# Comparison operators map straight onto C-implemented functions
+# (BETWEEN takes two bounds and is handled separately)
+_OPS = {
+    ComparisonOperator.LT: operator.lt,
+    ComparisonOperator.LTE: operator.le,
+    ComparisonOperator.GT: operator.gt,
+    ComparisonOperator.GTE: operator.ge,
+    ComparisonOperator.EQ: operator.eq,
+    ComparisonOperator.NEQ: operator.ne,
+}
+
+# Position of each target in the favourites list (RunnerTarget stays a str enum
+# so strategies keep their JSON form)
+_TARGET_INDEX = {
+    RunnerTarget.FAVOURITE: 0,
+    RunnerTarget.SECOND_FAVOURITE: 1,
+    RunnerTarget.THIRD_FAVOURITE: 2,
+}
+
+
+@dataclass(slots=True)
 class BetInstruction:
     """A specific bet to place, output of strategy evaluation."""
     market_id: str
@@ -26,14 +46,15 @@ class BetInstruction:
     bet_type: str       # "LAY" or "BACK"
     price: float        # the odds
     stake: float        # the size
+    liability: float = field(init=False)  # computed once from stake and price
     rule_id: str
     rule_name: str
 
-    @property
-    def liability(self) -> float:
+    def __post_init__(self):
         if self.bet_type == "LAY":
-            return round(self.stake * (self.price - 1), 2)
-        return self.stake
+            self.liability = round(self.stake * (self.price - 1), 2)
+        else:
+            self.liability = self.stake
 
     def to_dict(self) -> dict:
         return {
@@ -49,7 +70,7 @@ class BetInstruction:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class EvaluationResult:
     """Output of evaluating a strategy against a market."""
     market_id: str
@@ -63,6 +84,14 @@ class EvaluationResult:
     second_favourite: Optional[dict] = None
     skipped: bool = False
     skip_reason: str = ""
+    # Running totals, kept in step by add_instruction()
+    total_stake: float = 0.0
+    total_liability: float = 0.0
+
+    def add_instruction(self, instruction: BetInstruction):
+        self.instructions.append(instruction)
+        self.total_stake += instruction.stake
+        self.total_liability += instruction.liability
 
     def to_dict(self) -> dict:
         return {
@@ -77,24 +106,116 @@ class EvaluationResult:
             "second_favourite": self.second_favourite,
             "skipped": self.skipped,
             "skip_reason": self.skip_reason,
-            "total_stake": sum(i.stake for i in self.instructions),
-            "total_liability": sum(i.liability for i in self.instructions),
+            "total_stake": self.total_stake,
+            "total_liability": self.total_liability,
         }
 
 
-def _get_sorted_active_runners(market: MarketSnapshot) -> list[RunnerSnapshot]:
-    """Get active runners sorted by best available to lay (lowest first = favourite)."""
-    active = [
-        r for r in market.runners
-        if r.status == "ACTIVE" and r.best_available_to_lay is not None
-    ]
-    active.sort(key=lambda r: r.best_available_to_lay)
-    return active
+def _count_active(market: MarketSnapshot) -> int:
+    """Number of active runners with a lay price, without building a list."""
+    count = 0
+    for r in market.runners:
+        if r.status == "ACTIVE" and r.best_available_to_lay is not None:
+            count += 1
+    return count
+
+
+def _top3_active(market: MarketSnapshot) -> tuple[list[RunnerSnapshot], int]:
+    """
+    The (up to) three active runners with the lowest lay price (favourite first,
+    ties in runner order), plus the total active count.
+    Nothing past the third favourite is ever read, so a single selection pass
+    replaces sorting the whole field.
+    """
+    count = 0
+    first = second = third = None
+    p1 = p2 = p3 = 0.0
+    for r in market.runners:
+        if r.status != "ACTIVE":
+            continue
+        price = r.best_available_to_lay
+        if price is None:
+            continue
+        count += 1
+        # Strict < keeps the earlier runner ahead on ties, like a stable sort
+        if first is None or price < p1:
+            third, p3 = second, p2
+            second, p2 = first, p1
+            first, p1 = r, price
+        elif second is None or price < p2:
+            third, p3 = second, p2
+            second, p2 = r, price
+        elif third is None or price < p3:
+            third, p3 = r, price
+    top = [r for r in (first, second, third) if r is not None]
+    return top, count
+
+
+def _top2_active(market: MarketSnapshot) -> tuple[list[RunnerSnapshot], int]:
+    """As _top3_active, for strategies that never look past the second favourite."""
+    count = 0
+    first = second = None
+    p1 = p2 = 0.0
+    for r in market.runners:
+        if r.status != "ACTIVE":
+            continue
+        price = r.best_available_to_lay
+        if price is None:
+            continue
+        count += 1
+        if first is None or price < p1:
+            second, p2 = first, p1
+            first, p1 = r, price
+        elif second is None or price < p2:
+            second, p2 = r, price
+    if second is not None:
+        return [first, second], count
+    return ([first] if first is not None else []), count
+
+
+def build_field_values(
+    market: MarketSnapshot,
+    active: Optional[list[RunnerSnapshot]] = None,
+    active_count: Optional[int] = None,
+) -> dict[FieldRef, Optional[float]]:
+    """
+    Compute every FieldRef value for a market in one go, so conditions can look
+    their field up instead of re-deriving it per condition.
+    `active` may be just the leading favourites if `active_count` is given.
+    """
+    if active is None:
+        active, active_count = _top3_active(market)
+    elif active_count is None:
+        active_count = len(active)
+    fav = active[0] if len(active) >= 1 else None
+    second_fav = active[1] if len(active) >= 2 else None
+
+    return {
+        FieldRef.FAV_LAY_ODDS: fav.best_available_to_lay if fav else None,
+        FieldRef.FAV_BACK_ODDS: fav.best_available_to_back if fav else None,
+        FieldRef.SECOND_FAV_LAY_ODDS: second_fav.best_available_to_lay if second_fav else None,
+        FieldRef.SECOND_FAV_BACK_ODDS: second_fav.best_available_to_back if second_fav else None,
+        FieldRef.GAP_TO_SECOND: (
+            second_fav.best_available_to_lay - fav.best_available_to_lay
+            if fav and second_fav else None
+        ),
+        FieldRef.RUNNER_COUNT: float(active_count),
+        FieldRef.TOTAL_MATCHED: market.total_matched,
+        FieldRef.FAV_TOTAL_MATCHED: fav.total_matched if fav else None,
+    }
 
 
 def resolve_field(field_ref: FieldRef, market: MarketSnapshot) -> Optional[float]:
-    """Extract a field value from a market snapshot for condition evaluation."""
-    active = _get_sorted_active_runners(market)
+    """
+    Extract a field value from a market snapshot for condition evaluation.
+    Only the requested field is computed; market-level fields skip runner selection.
+    """
+    if field_ref == FieldRef.TOTAL_MATCHED:
+        return market.total_matched
+    if field_ref == FieldRef.RUNNER_COUNT:
+        return float(_count_active(market))
+
+    active, _ = _top2_active(market)
     fav = active[0] if len(active) >= 1 else None
     second_fav = active[1] if len(active) >= 2 else None
 
@@ -110,10 +231,6 @@ def resolve_field(field_ref: FieldRef, market: MarketSnapshot) -> Optional[float
         if fav and second_fav:
             return second_fav.best_available_to_lay - fav.best_available_to_lay
         return None
-    elif field_ref == FieldRef.RUNNER_COUNT:
-        return float(len(active))
-    elif field_ref == FieldRef.TOTAL_MATCHED:
-        return market.total_matched
     elif field_ref == FieldRef.FAV_TOTAL_MATCHED:
         return fav.total_matched if fav else None
 
@@ -121,50 +238,34 @@ def resolve_field(field_ref: FieldRef, market: MarketSnapshot) -> Optional[float
 
 
 def evaluate_condition(condition: Condition, market: MarketSnapshot) -> bool:
-    """Evaluate a single condition against a market."""
-    actual = resolve_field(condition.field, market)
-    if actual is None:
-        return False
-
-    value = float(condition.value)
-
-    if condition.operator == ComparisonOperator.LT:
-        return actual < value
-    elif condition.operator == ComparisonOperator.LTE:
-        return actual <= value
-    elif condition.operator == ComparisonOperator.GT:
-        return actual > value
-    elif condition.operator == ComparisonOperator.GTE:
-        return actual >= value
-    elif condition.operator == ComparisonOperator.EQ:
-        return actual == value
-    elif condition.operator == ComparisonOperator.NEQ:
-        return actual != value
-    elif condition.operator == ComparisonOperator.BETWEEN:
-        high = float(condition.value_high) if condition.value_high is not None else value
-        return value <= actual <= high
-
-    return False
+    """Evaluate a single condition against a market (via the compiled evaluator)."""
+    field_values = {condition.field: resolve_field(condition.field, market)}
+    return _conditions_met((_compile_condition(condition),), field_values)
 
 
 def resolve_target(
     target: RunnerTarget, market: MarketSnapshot
 ) -> list[RunnerSnapshot]:
     """Resolve a runner target to actual runner(s)."""
-    active = _get_sorted_active_runners(market)
+    active, _ = _top3_active(market)
+
+    index = _TARGET_INDEX.get(target)
+    if index is None or index >= len(active):
+        return []
+    return [active[index]]
 
-    if target == RunnerTarget.FAVOURITE:
-        return [active[0]] if len(active) >= 1 else []
-    elif target == RunnerTarget.SECOND_FAVOURITE:
-        return [active[1]] if len(active) >= 2 else []
-    elif target == RunnerTarget.THIRD_FAVOURITE:
-        return [active[2]] if len(active) >= 3 else []
 
-    return []
+def _lower_patterns(patterns: list[str]) -> tuple[tuple[str, str], ...]:
+    """Pair each pattern with its lowercase form for case-insensitive matching."""
+    return tuple((p.lower(), p) for p in patterns)
 
 
 def _check_market_filters(
-    filters: Optional[MarketFilter], market: MarketSnapshot
+    filters: Optional[MarketFilter],
+    market: MarketSnapshot,
+    active: Optional[list[RunnerSnapshot]] = None,
+    venue_patterns: Optional[tuple[tuple[str, str], ...]] = None,
+    active_count: Optional[int] = None,
 ) -> Optional[str]:
     """
     Check if a market passes the strategy filters.
@@ -173,36 +274,177 @@ def _check_market_filters(
     if filters is None:
         return None
 
+    # Cheap flag/string checks first, so rejected markets never touch runners
     if filters.exclude_inplay and market.inplay:
         return "In-play market excluded"
 
-    active_count = len(_get_sorted_active_runners(market))
+    if filters.countries and market.event_country not in filters.countries:
+        return f"Country {market.event_country} not in {filters.countries}"
+
+    if venue_patterns is None:
+        venue_patterns = _lower_patterns(filters.venue_excludes)
+    if venue_patterns:
+        venue = market.venue.lower()
+        for pattern_lower, pattern in venue_patterns:
+            if pattern_lower in venue:
+                return f"Venue '{market.venue}' excluded by filter '{pattern}'"
+
+    if active_count is None:
+        active_count = len(active) if active is not None else _count_active(market)
     if active_count < filters.min_runners:
         return f"Only {active_count} active runners (min: {filters.min_runners})"
 
     if filters.max_runners and active_count > filters.max_runners:
         return f"{active_count} runners exceeds max ({filters.max_runners})"
 
-    if filters.countries and market.event_country not in filters.countries:
-        return f"Country {market.event_country} not in {filters.countries}"
+    return None
 
-    if filters.venue_excludes:
-        for pattern in filters.venue_excludes:
-            if pattern.lower() in market.venue.lower():
-                return f"Venue '{market.venue}' excluded by filter '{pattern}'"
 
-    return None
+# ── Compiled strategies ──
+#
+# A Strategy is interpreted once per market, so everything that does not depend
+# on the market (rule order, float thresholds, operator lookup, runner targets)
+# is resolved up front by compile_strategy().
+
+
+class CompiledCondition(NamedTuple):
+    """Plain tuple, so the evaluation loop unpacks it in one step."""
+    field: FieldRef
+    op: Optional[Callable[[float, float], bool]]  # None = BETWEEN
+    value: float
+    value_high: float  # upper bound for BETWEEN
+
+
+@dataclass(slots=True)
+class CompiledAction:
+    target: RunnerTarget
+    target_index: int  # position in the favourites list, from _TARGET_INDEX
+    bet_type: str
+    stake: float
+
+
+@dataclass(slots=True)
+class CompiledRule:
+    id: str
+    name: str
+    conditions: tuple[CompiledCondition, ...]
+    actions: tuple[CompiledAction, ...]
+    stop_on_match: bool
+
+
+@dataclass(slots=True)
+class CompiledStrategy:
+    """A Strategy flattened into priority-ordered rules with pre-resolved values."""
+    id: str
+    name: str
+    rules: tuple[CompiledRule, ...]
+    market_filters: Optional[MarketFilter]
+    # (lowercase, original) venue_excludes, lowered once rather than per market
+    venue_excludes: tuple[tuple[str, str], ...] = ()
+    # Favourite selector: _top2_active unless some action targets the third favourite
+    select_active: Callable[
+        [MarketSnapshot], tuple[list[RunnerSnapshot], int]
+    ] = _top3_active
+
+
+# Static condition order: market-level thresholds reject most markets outright,
+# so they are tried before odds conditions. Conditions are AND-ed with no side
+# effects, so reordering never changes which rules match.
+_FIELD_ORDER = {
+    FieldRef.RUNNER_COUNT: 0,
+    FieldRef.TOTAL_MATCHED: 0,
+    FieldRef.FAV_TOTAL_MATCHED: 1,
+}
+_ODDS_FIELD_RANK = 2
+
+
+def _condition_rank(condition: Condition) -> int:
+    return _FIELD_ORDER.get(condition.field, _ODDS_FIELD_RANK)
+
+
+def _compile_condition(condition: Condition) -> CompiledCondition:
+    value = float(condition.value)
+    high = float(condition.value_high) if condition.value_high is not None else value
+    return CompiledCondition(
+        field=condition.field,
+        op=_OPS.get(condition.operator),
+        value=value,
+        value_high=high,
+    )
+
+
+def compile_strategy(strategy: Strategy) -> CompiledStrategy:
+    """Compile a Strategy once so evaluate_strategy does no per-market setup."""
+    sorted_rules = sorted(strategy.rules, key=lambda r: r.priority)
+    # Fields only ever read the first two favourites; actions may reach the third
+    needs_third = any(
+        _TARGET_INDEX[action.target] >= 2
+        for rule in sorted_rules for action in rule.actions
+    )
+    return CompiledStrategy(
+        id=strategy.id,
+        name=strategy.name,
+        rules=tuple(
+            CompiledRule(
+                id=rule.id,
+                name=rule.name,
+                conditions=tuple(
+                    _compile_condition(c)
+                    for c in sorted(rule.conditions, key=_condition_rank)
+                ),
+                actions=tuple(
+                    CompiledAction(
+                        target=a.target,
+                        target_index=_TARGET_INDEX[a.target],
+                        bet_type=a.bet_type,
+                        stake=a.stake,
+                    )
+                    for a in rule.actions
+                ),
+                stop_on_match=rule.stop_on_match,
+            )
+            for rule in sorted_rules
+        ),
+        market_filters=strategy.market_filters,
+        venue_excludes=(
+            _lower_patterns(strategy.market_filters.venue_excludes)
+            if strategy.market_filters else ()
+        ),
+        select_active=_top3_active if needs_third else _top2_active,
+    )
+
+
+def _conditions_met(
+    conditions: tuple[CompiledCondition, ...],
+    field_values: dict[FieldRef, Optional[float]],
+) -> bool:
+    """True if every condition holds (AND); a missing field value fails."""
+    for field_ref, op, value, value_high in conditions:
+        actual = field_values[field_ref]
+        if actual is None:
+            return False
+        if op is None:
+            if not value <= actual <= value_high:
+                return False
+        elif not op(actual, value):
+            return False
+    return True
 
 
 def evaluate_strategy(
-    strategy: Strategy, market: MarketSnapshot
+    strategy: Union[Strategy, CompiledStrategy], market: MarketSnapshot
 ) -> EvaluationResult:
     """
     Evaluate a full strategy against a market snapshot.
     Rules are sorted by priority and evaluated in order.
     For each rule, ALL conditions must be true (AND).
     If a rule matches and stop_on_match=True, skip remaining rules.
+    A plain Strategy is compiled on every call; callers evaluating many markets
+    should pass compile_strategy(strategy) instead.
     """
+    if isinstance(strategy, Strategy):
+        strategy = compile_strategy(strategy)
+
     result = EvaluationResult(
         market_id=market.market_id,
         market_name=market.market_name,
@@ -210,8 +452,10 @@ def evaluate_strategy(
         market_start_time=market.market_start_time,
     )
 
+    # Pick out the favourites once; every field, filter and target below reuses them
+    active, active_count = strategy.select_active(market)
+
     # Set favourite info for display
-    active = _get_sorted_active_runners(market)
     if len(active) >= 1:
         fav = active[0]
         result.favourite = {
@@ -228,44 +472,46 @@ def evaluate_strategy(
         }
 
     # Check market filters
-    skip_reason = _check_market_filters(strategy.market_filters, market)
+    skip_reason = _check_market_filters(
+        strategy.market_filters, market, active, strategy.venue_excludes, active_count
+    )
     if skip_reason:
         result.skipped = True
         result.skip_reason = skip_reason
         return result
 
-    # Evaluate rules in priority order
-    sorted_rules = sorted(strategy.rules, key=lambda r: r.priority)
+    # Evaluate rules in priority order (already sorted by compile_strategy)
+    field_values = build_field_values(market, active, active_count)
 
-    for rule in sorted_rules:
-        all_conditions_met = all(
-            evaluate_condition(c, market) for c in rule.conditions
-        )
-        if not all_conditions_met:
-            continue
+    matched_rules = (
+        rule for rule in strategy.rules
+        if _conditions_met(rule.conditions, field_values)
+    )
 
+    for rule in matched_rules:
         # Rule matched — generate bet instructions
         for action in rule.actions:
-            target_runners = resolve_target(action.target, market)
-            for runner in target_runners:
-                price = (
-                    runner.best_available_to_lay
-                    if action.bet_type == "LAY"
-                    else runner.best_available_to_back
-                )
-                if price is None:
-                    continue
-
-                result.instructions.append(BetInstruction(
-                    market_id=market.market_id,
-                    selection_id=runner.selection_id,
-                    runner_name=runner.runner_name,
-                    bet_type=action.bet_type,
-                    price=price,
-                    stake=action.stake,
-                    rule_id=rule.id,
-                    rule_name=rule.name,
-                ))
+            if action.target_index >= active_count:
+                continue
+            runner = active[action.target_index]
+            price = (
+                runner.best_available_to_lay
+                if action.bet_type == "LAY"
+                else runner.best_available_to_back
+            )
+            if price is None:
+                continue
+
+            result.add_instruction(BetInstruction(
+                market_id=market.market_id,
+                selection_id=runner.selection_id,
+                runner_name=runner.runner_name,
+                bet_type=action.bet_type,
+                price=price,
+                stake=action.stake,
+                rule_id=rule.id,
+                rule_name=rule.name,
+            ))
 
         result.matched_rule_id = rule.id
         result.matched_rule_name = rule.name
@@ -278,3 +524,15 @@ def evaluate_strategy(
         result.skip_reason = "No rules matched"
 
     return result
+
+
+def evaluate_markets(
+    strategy: Union[Strategy, CompiledStrategy], markets: list[MarketSnapshot]
+) -> list[EvaluationResult]:
+    """
+    Evaluate a strategy against a batch of markets (e.g. a whole back-test day).
+    Results are in input order.
+    """
+    if isinstance(strategy, Strategy):
+        strategy = compile_strategy(strategy)
+    return [evaluate_strategy(strategy, market) for market in markets]